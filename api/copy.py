@@ -1,36 +1,100 @@
 # api/copy.py
 import asyncio
-import json
+import contextlib
+import functools
 import os
 import re
 import shutil
+import stat
 import time
 import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import AsyncGenerator, Set
+from typing import AsyncGenerator, List, Optional, Set
 from urllib.parse import urljoin, urlparse
 
 import httpx
+import orjson
 from bs4 import BeautifulSoup
 from fastapi import FastAPI, Query, Request
 from fastapi.responses import FileResponse, StreamingResponse
 
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:  # fall back to the pure-Python parser
+    HTML_PARSER = "html.parser"
+
 app = FastAPI()
 
 # ---------------- CONFIG ----------------
 USER_AGENT = "Stark-Website-Cloner/1.0 (+https://stark.example)"
-CONCURRENT_DOWNLOADS = 8
+CONCURRENT_DOWNLOADS = 16
 HTTP_TIMEOUT = 30  # seconds
+HTTP_CONNECT_TIMEOUT = 10  # seconds
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # bytes per streamed read
+MAX_ASSETS = 1000  # assets downloaded per clone
+MAX_BYTES_PER_ASSET = 50 * 1024 * 1024  # larger assets are skipped
 TMP_ROOT = Path("/tmp")  # Vercel uses /tmp for ephemeral storage
 # ----------------------------------------
 
+# precompiled patterns
+_URL_FUNC_RE = re.compile(r"url\(([^)]+)\)")
+_AT_IMPORT_RE = re.compile(r'@import\s+(?:url\()?["\']?([^"\')]+)')
+_FN_BAD_RE = re.compile(r"[\\:*?\"<>|]")
+_QUERY_RE = re.compile(r"[^0-9a-zA-Z]")
+_ASSET_EXT_RE = re.compile(r"\.(css|js|png|jpg|jpeg|gif|svg|woff2?|ttf|eot|mp4|webm|ico)", re.I)
+
+# only these schemes are worth a request (skips data:, javascript:, mailto: ...)
+_FETCH_SCHEMES = {"http", "https"}
+
+# response content types worth saving as assets
+_ALLOWED_TYPES = {
+    "text/css",
+    "application/javascript",
+    "text/javascript",
+    "application/x-javascript",
+    # fonts are still often served with legacy or generic types
+    "application/font-woff",
+    "application/font-woff2",
+    "application/x-font-ttf",
+    "application/vnd.ms-fontobject",
+    "application/octet-stream",
+}
+_ALLOWED_TYPE_PREFIXES = ("image/", "font/", "video/", "audio/")
+
+# already-compressed formats are stored as-is in the zip
+_STORED_EXTS = {
+    "png", "jpg", "jpeg", "gif", "webp", "woff", "woff2", "mp4", "webm",
+    "ogg", "mp3", "zip", "gz", "br", "ico",
+}
+
+# tag -> attribute holding an asset reference
+_ASSET_ATTRS = {
+    "img": "src",
+    "script": "src",
+    "link": "href",
+    "source": "src",
+    "video": "poster",
+    "audio": "src",
+}
+
+# tag -> attribute pointed at the local copy when rewriting the page
+_REWRITE_ATTRS = {
+    "img": "src",
+    "script": "src",
+    "link": "href",
+    "source": "src",
+    "video": "poster",
+}
+
 # utilities
 def ensure_scheme(url: str) -> str:
     if not url.startswith("http://") and not url.startswith("https://"):
         return "http://" + url
     return url
 
+@functools.lru_cache(maxsize=4096)
 def safe_filename_from_url(url: str) -> str:
     parsed = urlparse(url)
     path = parsed.path or "/"
@@ -43,12 +107,42 @@ def safe_filename_from_url(url: str) -> str:
     host = parsed.netloc.replace(":", "_")
     filename = os.path.join(host, filename)
     # remove query and fragments
-    filename = re.sub(r"[\\:*?\"<>|]", "_", filename)
+    filename = _FN_BAD_RE.sub("_", filename)
     if parsed.query:
         # append a short query fingerprint to avoid overwrites
-        filename = filename + "_" + re.sub(r'[^0-9a-zA-Z]', '_', parsed.query)[:40]
+        filename = filename + "_" + _QUERY_RE.sub("_", parsed.query)[:40]
     return filename
 
+def resolve_asset_url(base_url: str, ref: str) -> Optional[str]:
+    # drop the fragment so "a.css" and "a.css#x" are fetched only once
+    url = urljoin(base_url, ref).split("#", 1)[0]
+    if urlparse(url).scheme not in _FETCH_SCHEMES:
+        return None
+    return url
+
+def is_allowed_content_type(content_type: str) -> bool:
+    if not content_type:
+        # plenty of static hosts omit it; judge by the url we already matched
+        return True
+    mime = content_type.split(";", 1)[0].strip().lower()
+    return mime in _ALLOWED_TYPES or mime.startswith(_ALLOWED_TYPE_PREFIXES)
+
+def _discard_opened_file(path: Path, task: asyncio.Future):
+    if not task.cancelled() and task.exception() is None:
+        task.result().close()
+        # open() already created the file; nothing will ever be written to it
+        path.unlink(missing_ok=True)
+
+async def open_for_write(path: Path):
+    # a cancelled to_thread() still finishes the open in its thread; shield it
+    # and discard whatever it returns instead of leaking the file object
+    task = asyncio.ensure_future(asyncio.to_thread(open, path, "wb"))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        task.add_done_callback(functools.partial(_discard_opened_file, path))
+        raise
+
 def make_workspace() -> Path:
     ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
     root = TMP_ROOT / f"stark_clone_{ts}"
@@ -59,8 +153,7 @@ def make_workspace() -> Path:
 
 def write_json(path: Path, obj):
     path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2, ensure_ascii=False)
+    path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
 
 async def fetch_text(client: httpx.AsyncClient, url: str):
     r = await client.get(url, timeout=HTTP_TIMEOUT, follow_redirects=True)
@@ -72,64 +165,155 @@ async def fetch_bytes(client: httpx.AsyncClient, url: str):
     r.raise_for_status()
     return r.content
 
-def find_asset_urls(base_url: str, html: str) -> Set[str]:
-    soup = BeautifulSoup(html, "html.parser")
-    urls = set()
-    tags_attrs = [
-        ("img", "src"),
-        ("script", "src"),
-        ("link", "href"),
-        ("source", "src"),
-        ("video", "poster"),
-        ("audio", "src"),
-    ]
-    for tag, attr in tags_attrs:
-        for el in soup.find_all(tag):
-            v = el.get(attr)
+def find_asset_urls(base_url: str, soup: BeautifulSoup, limit: Optional[int] = None) -> List[str]:
+    # dict keeps document order, so a limit keeps the first assets on the page
+    urls = {}
+
+    def add(ref):
+        url = resolve_asset_url(base_url, ref)
+        if url:
+            urls[url] = None
+
+    # single pass over every element instead of one find_all() per tag
+    for el in soup.find_all(True):
+        if limit is not None and len(urls) >= limit:
+            break
+        name = el.name
+        # read the plain attribute dict directly rather than through Tag.get()
+        attrs = el.attrs
+        attr = _ASSET_ATTRS.get(name)
+        if attr:
+            v = attrs.get(attr)
             if v:
-                urls.add(urljoin(base_url, v))
-
-    # srcset
-    for el in soup.find_all(srcset=True):
-        ss = el.get("srcset")
-        for part in ss.split(","):
-            src = part.strip().split(" ")[0]
-            if src:
-                urls.add(urljoin(base_url, src))
-
-    # inline style url(...)
-    for el in soup.find_all(style=True):
-        style = el.get("style")
-        for m in re.findall(r"url\(([^)]+)\)", style):
-            mclean = m.strip(' \'"')
-            urls.add(urljoin(base_url, mclean))
-
-    # look for CSS-imported URLs inside <style> tags
-    for el in soup.find_all("style"):
-        text = el.string or ""
-        for m in re.findall(r"url\(([^)]+)\)", text):
-            mclean = m.strip(' \'"')
-            urls.add(urljoin(base_url, mclean))
-
-    # also add hrefs (may include fonts/icons)
-    for el in soup.find_all("a", href=True):
-        # don't add regular page links as assets; we only want static resources
-        href = el.get("href")
-        if href and re.search(r"\.(css|js|png|jpg|jpeg|gif|svg|woff2?|ttf|eot|mp4|webm|ico)", href, re.I):
-            urls.add(urljoin(base_url, href))
-
-    return urls
-
-def extract_css_urls_from_text(base_url: str, css_text: str):
-    urls = set()
-    for m in re.findall(r"url\(([^)]+)\)", css_text):
+                add(v)
+
+        # srcset
+        ss = attrs.get("srcset")
+        if ss:
+            for part in ss.split(","):
+                src = part.strip().split(" ")[0]
+                if src:
+                    add(src)
+
+        # inline style url(...)
+        style = attrs.get("style")
+        if style:
+            for m in _URL_FUNC_RE.findall(style):
+                mclean = m.strip(' \'"')
+                add(mclean)
+
+        if name == "style":
+            # look for CSS-imported URLs inside <style> tags
+            text = el.string or ""
+            for m in _URL_FUNC_RE.findall(text):
+                mclean = m.strip(' \'"')
+                add(mclean)
+        elif name == "a":
+            # also add hrefs (may include fonts/icons)
+            # don't add regular page links as assets; we only want static resources
+            href = attrs.get("href")
+            if href and _ASSET_EXT_RE.search(href):
+                add(href)
+
+    return list(urls)[:limit]
+
+def extract_css_urls_from_text(base_url: str, css_text: str) -> List[str]:
+    urls = {}
+
+    def add(ref):
+        url = resolve_asset_url(base_url, ref)
+        if url:
+            urls[url] = None
+
+    for m in _URL_FUNC_RE.findall(css_text):
         mclean = m.strip(' \'"')
         if mclean:
-            urls.add(urljoin(base_url, mclean))
+            add(mclean)
     # @import "..."
-    for m in re.findall(r'@import\s+(?:url\()?["\']?([^"\')]+)', css_text):
-        urls.add(urljoin(base_url, m))
-    return urls
+    for m in _AT_IMPORT_RE.findall(css_text):
+        add(m)
+    return list(urls)
+
+def find_stylesheet_links(base_url: str, soup: BeautifulSoup):
+    css_links = []
+    for link in soup.find_all("link", rel=lambda v: v and "stylesheet" in v):
+        href = link.get("href")
+        css_url = resolve_asset_url(base_url, href) if href else None
+        if css_url and css_url not in css_links:
+            css_links.append(css_url)
+    return css_links
+
+# BeautifulSoup work is CPU-bound; these run via asyncio.to_thread so the
+# event loop keeps streaming events and driving downloads meanwhile
+def _parse_and_find(html: str, base_url: str):
+    soup = BeautifulSoup(html, HTML_PARSER)
+    # one past the cap, so the caller can tell the page was actually cut short
+    return soup, find_asset_urls(base_url, soup, MAX_ASSETS + 1), find_stylesheet_links(base_url, soup)
+
+def _rewrite_html(soup: BeautifulSoup, base_url: str, saved_urls: Set[str]) -> bytes:
+    # the same reference usually appears many times; resolve each once
+    local_names = {}
+
+    def local_name(val):
+        new_rel = local_names.get(val)
+        if new_rel is None:
+            abs_url = resolve_asset_url(base_url, val)
+            if abs_url in saved_urls:
+                new_rel = safe_filename_from_url(abs_url)
+            elif abs_url:
+                # skipped or failed: keep pointing at the original location
+                new_rel = urljoin(base_url, val)
+            else:
+                # leave data:/javascript: references as they are
+                new_rel = val
+            local_names[val] = new_rel
+        return new_rel
+
+    # single pass over every element, rewriting in place
+    for el in soup.find_all(True):
+        attrs = el.attrs
+        attr = _REWRITE_ATTRS.get(el.name)
+        if attr:
+            val = attrs.get(attr)
+            if val:
+                attrs[attr] = local_name(val)
+
+        # srcset
+        ss = attrs.get("srcset")
+        if ss:
+            parts = []
+            for part in ss.split(","):
+                src = part.strip().split(" ")[0]
+                parts.append(local_name(src))
+            attrs["srcset"] = ", ".join(parts)
+
+        # inline styles: replace url(...) with local filenames where possible
+        style = attrs.get("style")
+        if style:
+            parts = []
+            pos = 0
+            for m in _URL_FUNC_RE.finditer(style):
+                parts.append(style[pos:m.start()])
+                parts.append("url('" + local_name(m.group(1).strip(' \'"')) + "')")
+                pos = m.end()
+            if pos:
+                parts.append(style[pos:])
+                attrs["style"] = "".join(parts)
+
+    return soup.encode(formatter="minimal")
+
+def _build_zip(root: Path, zip_path: Path, on_file=None):
+    # runs in a worker thread; deflate only what is worth compressing
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        files = [p for p in root.rglob("*") if p.is_file()]
+        for p in files:
+            arcname = p.relative_to(root).as_posix()
+            if p.suffix[1:].lower() in _STORED_EXTS:
+                zf.write(str(p), arcname, compress_type=zipfile.ZIP_STORED)
+            else:
+                zf.write(str(p), arcname)
+            if on_file:
+                on_file()
 
 # SSE helper
 async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
@@ -140,11 +324,18 @@ async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
     zipped_fullpath = TMP_ROOT / zipped_name
 
     headers = {"User-Agent": USER_AGENT}
-    async with httpx.AsyncClient(headers=headers) as client:
+    # one HTTP/2 connection multiplexes most same-origin assets; the pool is
+    # sized so every worker can keep its own keep-alive connection as well
+    limits = httpx.Limits(
+        max_connections=CONCURRENT_DOWNLOADS * 2,
+        max_keepalive_connections=CONCURRENT_DOWNLOADS * 2,
+    )
+    timeout = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    async with httpx.AsyncClient(http2=True, headers=headers, limits=limits, timeout=timeout) as client:
         # fetch main html
         try:
             yield "event: status\ndata: fetching_html\n\n"
-            resp = await client.get(web_url, timeout=HTTP_TIMEOUT, follow_redirects=True)
+            resp = await client.get(web_url, follow_redirects=True)
             resp.raise_for_status()
             html = resp.text
             yield "event: status\ndata: fetched_html\n\n"
@@ -152,43 +343,11 @@ async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
             yield f"event: error\ndata: failed_fetch_html: {str(e)}\n\n"
             return
 
-        # collect asset urls
-        asset_urls = set()
-        asset_urls.update(find_asset_urls(web_url, html))
-
-        soup = BeautifulSoup(html, "html.parser")
-        css_links = []
-        for link in soup.find_all("link", rel=lambda v: v and "stylesheet" in v):
-            href = link.get("href")
-            if href:
-                css_links.append(urljoin(web_url, href))
+        # parse once; the same soup is used for discovery and rewriting
+        soup, asset_urls, css_links = await asyncio.to_thread(_parse_and_find, html, web_url)
 
-        # fetch CSS to discover url(...) references
-        css_texts = {}
-        for css_url in css_links:
-            try:
-                yield f"event: status\ndata: fetching_css {css_url}\n\n"
-                r = await client.get(css_url, timeout=HTTP_TIMEOUT, follow_redirects=True)
-                if r.status_code == 200:
-                    css_texts[css_url] = r.text
-                    css_assets = extract_css_urls_from_text(web_url, r.text)
-                    asset_urls.update(css_assets)
-            except Exception:
-                continue
-
-        # include css links themselves
-        asset_urls.update(css_links)
-
-        # avoid adding the main page if present
-        asset_urls.discard(web_url)
-
-        total_items = len(asset_urls) + 1
-        yield f"event: meta\ndata: {{\"total_items\": {total_items}}}\n\n"
-
-        # save main html to workspace (will rewrite later)
+        # main html is written once, after rewriting
         main_html_path = root / "index.html"
-        main_html_path.parent.mkdir(parents=True, exist_ok=True)
-        main_html_path.write_text(html, encoding="utf-8")
 
         # state trackers
         bytes_downloaded = 0
@@ -196,54 +355,159 @@ async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
         last_update = time.time()
         downloaded_files = []
 
-        sem = asyncio.Semaphore(CONCURRENT_DOWNLOADS)
+        # persistent workers pull urls from a queue and push SSE strings onto
+        # an event queue, so one slow asset never holds up the others
+        url_queue: asyncio.Queue = asyncio.Queue()
+        events: asyncio.Queue = asyncio.Queue()
+
+        # every url handed to the workers; the main page itself is never an asset
+        seen = {web_url.split("#", 1)[0]}
+        limit_reached = False
+
+        def at_limit():
+            # seen also holds the main page, so MAX_ASSETS are already queued
+            return len(seen) > MAX_ASSETS
+
+        def enqueue(urls):
+            nonlocal limit_reached
+            for u in urls:
+                if u not in seen:
+                    if at_limit():
+                        # only reported once a url is actually refused
+                        if not limit_reached:
+                            limit_reached = True
+                            events.put_nowait(f"event: status\ndata: asset_limit_reached ({MAX_ASSETS})\n\n")
+                        return
+                    seen.add(u)
+                    url_queue.put_nowait(u)
+
+        async def skip_asset(url: str, reason: str):
+            ev = orjson.dumps({"url": url, "reason": reason}).decode()
+            await events.put(f"event: asset_skipped\ndata: {ev}\n\n")
 
         async def download_and_save(url: str):
             nonlocal bytes_downloaded, bytes_since_last
-            async with sem:
-                try:
-                    r = await client.get(url, timeout=HTTP_TIMEOUT, follow_redirects=True)
+            try:
+                # stream straight to disk so peak memory is one chunk per worker
+                async with client.stream("GET", url, follow_redirects=True) as r:
                     r.raise_for_status()
-                    content = r.content
+                    content_type = r.headers.get("content-type", "")
+                    if not is_allowed_content_type(content_type):
+                        await skip_asset(url, f"content_type: {content_type}")
+                        return
+                    if int(r.headers.get("content-length", "0")) > MAX_BYTES_PER_ASSET:
+                        await skip_asset(url, "too_large")
+                        return
                     local_rel = safe_filename_from_url(url)
                     local_path = root / local_rel
-                    local_path.parent.mkdir(parents=True, exist_ok=True)
-                    with open(local_path, "wb") as f:
-                        f.write(content)
-                    bytes_downloaded += len(content)
-                    bytes_since_last += len(content)
-                    downloaded_files.append({"url": url, "local": str(local_path), "size": len(content)})
-                    # emit asset event
-                    ev = json.dumps({"url": url, "saved": str(local_path), "size": len(content)})
-                    yield f"event: asset\ndata: {ev}\n\n"
-                except Exception as e:
-                    ev = json.dumps({"url": url, "error": str(e)})
-                    yield f"event: asset_error\ndata: {ev}\n\n"
-
-        # download assets in batches
-        url_list = list(asset_urls)
-        # create a queue of coroutines and run them in limited concurrency
-        tasks = []
-        for u in url_list:
-            tasks.append(download_and_save(u))
-
-        # run tasks while streaming their single yields
-        async def run_tasks_and_emit(task_generators):
-            nonlocal bytes_since_last, last_update
-            # consume in chunks to avoid creating too many coroutines
-            for i in range(0, len(task_generators), CONCURRENT_DOWNLOADS):
-                batch = task_generators[i : i + CONCURRENT_DOWNLOADS]
-                # wrap batch items to collect their yielded string
-                async def consume(gen):
-                    async for ev in gen:
-                        return ev
-                    return None
-                results = await asyncio.gather(*[consume(g) for g in batch], return_exceptions=True)
+                    # file I/O goes to a thread so a slow disk never stalls the loop
+                    await asyncio.to_thread(local_path.parent.mkdir, parents=True, exist_ok=True)
+                    size = 0
+                    too_large = False
+                    complete = False
+                    f = await open_for_write(local_path)
+                    try:
+                        async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            # content-length may be missing or wrong
+                            if size + len(chunk) > MAX_BYTES_PER_ASSET:
+                                too_large = True
+                                break
+                            await asyncio.to_thread(f.write, chunk)
+                            size += len(chunk)
+                            bytes_downloaded += len(chunk)
+                            bytes_since_last += len(chunk)
+                        complete = not too_large
+                    finally:
+                        await asyncio.to_thread(f.close)
+                        if not complete:
+                            # never leave a truncated asset behind, nor count it
+                            bytes_downloaded -= size
+                            bytes_since_last = max(0, bytes_since_last - size)
+                            await asyncio.to_thread(local_path.unlink, missing_ok=True)
+                if too_large:
+                    await skip_asset(url, "too_large")
+                    return
+                downloaded_files.append({"url": url, "local": str(local_path), "size": size})
+                # emit asset event
+                ev = orjson.dumps({"url": url, "saved": str(local_path), "size": size}).decode()
+                await events.put(f"event: asset\ndata: {ev}\n\n")
+            except Exception as e:
+                ev = orjson.dumps({"url": url, "error": str(e)}).decode()
+                await events.put(f"event: asset_error\ndata: {ev}\n\n")
+
+        async def worker():
+            while True:
+                url = await url_queue.get()
+                if url is None:
+                    return
+                await download_and_save(url)
+
+        async def fetch_css(css_url: str):
+            r = await client.get(css_url, follow_redirects=True)
+            r.raise_for_status()
+            return r.text
+
+        # fetch CSS to discover url(...) references while the workers are
+        # already downloading what the HTML referenced
+        async def discover_css():
+            # own the fetch tasks so none outlive discovery (or the client);
+            # nothing they find could be queued once the cap is hit
+            if at_limit():
+                css_tasks = []
+            else:
+                css_tasks = [asyncio.create_task(fetch_css(u)) for u in css_links]
+            try:
+                if css_tasks:
+                    await events.put(f"event: status\ndata: fetching_css ({len(css_links)})\n\n")
+                    fetched = 0
+                    for fut in asyncio.as_completed(css_tasks):
+                        try:
+                            css_text = await fut
+                        except Exception:
+                            continue
+                        fetched += 1
+                        enqueue(extract_css_urls_from_text(web_url, css_text))
+                        if limit_reached:
+                            break
+                    await events.put(f"event: status\ndata: fetched_css ({fetched}/{len(css_links)})\n\n")
+                total_items = len(seen)  # assets plus the main html
+                await events.put(f"event: meta\ndata: {{\"total_items\": {total_items}}}\n\n")
+            finally:
+                for t in css_tasks:
+                    t.cancel()
+                await asyncio.gather(*css_tasks, return_exceptions=True)
+                # discovery is over: let the workers stop once the queue drains
+                for _ in range(CONCURRENT_DOWNLOADS):
+                    url_queue.put_nowait(None)
+
+        async def run_workers():
+            try:
+                # return_exceptions: on cancel, gather waits for every child to
+                # unwind instead of finishing with the first one cancelled
+                results = await asyncio.gather(
+                    discover_css(),
+                    *[worker() for _ in range(CONCURRENT_DOWNLOADS)],
+                    return_exceptions=True,
+                )
                 for res in results:
-                    if isinstance(res, Exception):
-                        yield f"event: asset_error\ndata: {{\"error\":\"{str(res)}\"}}\n\n"
-                    elif isinstance(res, str) and res:
-                        yield res
+                    if isinstance(res, BaseException):
+                        raise res
+            finally:
+                # sentinel: all workers are finished
+                await events.put(None)
+
+        # stylesheets and html-derived assets go out immediately; stylesheets
+        # first so they always make it under MAX_ASSETS
+        enqueue(css_links)
+        enqueue(asset_urls)
+
+        runner = asyncio.create_task(run_workers())
+        try:
+            while True:
+                ev = await events.get()
+                if ev is None:
+                    break
+                yield ev
                 # emit progress
                 now = time.time()
                 elapsed = now - last_update
@@ -252,64 +516,31 @@ async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
                     bytes_since_last = 0
                     last_update = now
                     yield f"event: progress\ndata: {{\"bytes_total\":{bytes_downloaded}, \"speed_bps\":{speed}}}\n\n"
-
-        try:
-            async for ev in run_tasks_and_emit(tasks):
-                yield ev
+            await runner
         except Exception as e:
             yield f"event: error\ndata: download_batch_failed: {str(e)}\n\n"
             # continue to try to rewrite whatever we have
+        finally:
+            # client went away mid-stream: stop the workers and wait for them
+            # before the http client below is closed
+            if not runner.done():
+                runner.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await runner
 
         # rewrite HTML to point to local files
         try:
             yield "event: status\ndata: rewriting_html\n\n"
-            html_text = main_html_path.read_text(encoding="utf-8", errors="ignore")
-            soup = BeautifulSoup(html_text, "html.parser")
-
-            def rewrite_attr(el, attr):
-                val = el.get(attr)
-                if not val:
-                    return
-                abs_url = urljoin(web_url, val)
-                new_rel = safe_filename_from_url(abs_url)
-                el[attr] = new_rel
-
-            for img in soup.find_all("img"):
-                rewrite_attr(img, "src")
-            for scr in soup.find_all("script"):
-                rewrite_attr(scr, "src")
-            for link in soup.find_all("link"):
-                rewrite_attr(link, "href")
-            for src in soup.find_all("source"):
-                rewrite_attr(src, "src")
-            for vid in soup.find_all("video"):
-                rewrite_attr(vid, "poster")
-
-            # srcset
-            for el in soup.find_all(srcset=True):
-                ss = el.get("srcset")
-                parts = []
-                for part in ss.split(","):
-                    src = part.strip().split(" ")[0]
-                    abs_url = urljoin(web_url, src)
-                    parts.append(safe_filename_from_url(abs_url))
-                el["srcset"] = ", ".join(parts)
-
-            # inline styles: replace url(...) with local filenames where possible
-            for style_el in soup.find_all(style=True):
-                style = style_el.get("style")
-                def repl(match):
-                    orig = match.group(1).strip(' \'"')
-                    new = safe_filename_from_url(urljoin(web_url, orig))
-                    return f"url('{new}')"
-                new_style = re.sub(r"url\(([^)]+)\)", repl, style)
-                style_el["style"] = new_style
+            saved_urls = {f["url"] for f in downloaded_files}
+            rewritten = await asyncio.to_thread(_rewrite_html, soup, web_url, saved_urls)
 
             # write rewritten html
-            main_html_path.write_text(soup.prettify(), encoding="utf-8")
+            main_html_path.write_bytes(rewritten)
             yield "event: status\ndata: html_rewritten\n\n"
         except Exception as e:
             yield f"event: error\ndata: rewrite_failed: {str(e)}\n\n"
+            # keep the original page so the clone is still usable
+            main_html_path.write_text(html, encoding="utf-8")
 
         # create info.json
         try:
@@ -329,12 +560,22 @@ async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
         # create zip
         try:
             yield "event: status\ndata: creating_zip\n\n"
-            with zipfile.ZipFile(zipped_fullpath, "w", zipfile.ZIP_DEFLATED) as zf:
-                for foldername, _, filenames in os.walk(root):
-                    for filename in filenames:
-                        file_path = os.path.join(foldername, filename)
-                        arcname = os.path.relpath(file_path, root)
-                        zf.write(file_path, arcname)
+            zipped_files = 0
+
+            def count_zipped():
+                nonlocal zipped_files
+                zipped_files += 1
+
+            # zip in a thread so progress keeps flowing while it runs
+            zip_task = asyncio.create_task(
+                asyncio.to_thread(_build_zip, root, zipped_fullpath, count_zipped)
+            )
+            while True:
+                done, _ = await asyncio.wait({zip_task}, timeout=0.5)
+                if done:
+                    break
+                yield f"event: zip_progress\ndata: {{\"zip_files\": {zipped_files}}}\n\n"
+            zip_task.result()
             yield "event: status\ndata: zip_created\n\n"
         except Exception as e:
             yield f"event: error\ndata: zip_failed: {str(e)}\n\n"
@@ -347,7 +588,7 @@ async def sse_generator(web_url: str) -> AsyncGenerator[str, None]:
             "zip_name": zipped_name,
             "elapsed_seconds": int(elapsed),
         }
-        yield f"event: done\ndata: {json.dumps(final_meta)}\n\n"
+        yield f"event: done\ndata: {orjson.dumps(final_meta).decode()}\n\n"
         return
 
 @app.get("/copy")
@@ -375,9 +616,19 @@ def home():
         "author": "STARK"
     }
     
+class ZipFileResponse(FileResponse):
+    # clones can run to hundreds of MB; read them in 1 MiB chunks, not 64 KiB
+    chunk_size = 1 << 20
+
 @app.get("/download/{zipname}")
 def download_zip(zipname: str):
     path = TMP_ROOT / zipname
-    if not path.exists():
+    try:
+        # stat once here so the response doesn't stat the file again
+        stat_result = path.stat()
+    except OSError:
+        return {"error": "not_found"}
+    # a precomputed stat_result skips Starlette's own regular-file check
+    if not stat.S_ISREG(stat_result.st_mode):
         return {"error": "not_found"}
-    return FileResponse(path, filename=zipname, media_type="application/zip")
+    return ZipFileResponse(path, filename=zipname, media_type="application/zip", stat_result=stat_result)